@@ -1,53 +1,68 @@
 import boto3
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from airflow.decorators import task
 from airflow.models.dag import DAG
 from airflow.providers.amazon.aws.operators.ec2 import (
     EC2CreateInstanceOperator,
     EC2TerminateInstanceOperator,
 )
+from airflow.providers.amazon.aws.sensors.ec2 import EC2InstanceStateSensor
 from airflow.providers.amazon.aws.hooks.s3 import S3Hook
 from airflow.hooks.base import BaseHook
-import paramiko
 from airflow.utils.trigger_rule import TriggerRule
 from airflow.models import Variable
+import gzip
 import os
 from airflow.configuration import conf
 import logging
-from io import StringIO, BytesIO
+from fd_jenkins_sensor import JenkinsBuildSensor
+from fd_ssh import ssh_pool
 
 
 
-# Jenkins Configuration: Load from Airflow Variables
-JENKINS_URL = Variable.get("JENKINS_URL")
-JENKINS_USER = Variable.get("JENKINS_USER")
-JENKINS_TOKEN = Variable.get("JENKINS_TOKEN")
-JENKINS_JOB_NAME = Variable.get("JENKINS_JOB_NAME")
+# NOTE: Variables and connections are looked up inside the tasks (or passed to
+# operators as Jinja templates) rather than at module scope.  Every top-level
+# Variable.get / BaseHook.get_connection is a metadata DB query that the
+# scheduler pays on each parse of this file, so keeping the module body free of
+# them keeps DAG parse time near zero.
 
-# Get AWS connection details from Airflow
-KEY_PAIR_NAME=Variable.get("KEY_PAIR_NAME")
-KEY_PATH = Variable.get("KEY_PATH")  # Path to your private key inside the container
-AMI_ID=Variable.get("AMI_ID")
-SECURITY_GROUP_ID=Variable.get("SECURITY_GROUP_ID")
-INSTANCE_TYPE=Variable.get("INSTANCE_TYPE")
-aws_conn = BaseHook.get_connection('aws_default')  # Use the Airflow AWS connection
-aws_access_key_id = aws_conn.login
-aws_secret_access_key = aws_conn.password
-region_name = aws_conn.extra_dejson.get('region_name', 'eu-west-3')  # Default to 'eu-west-3'
 
-# Retrieve other env variables for MLFlow to run
-MLFLOW_TRACKING_URI=Variable.get("MLFLOW_TRACKING_URI")
-MLFLOW_EXPERIMENT_ID=Variable.get("MLFLOW_EXPERIMENT_ID")
-AWS_ACCESS_KEY_ID= aws_access_key_id
-AWS_SECRET_ACCESS_KEY=aws_secret_access_key
-BUCKET_NAME = Variable.get("BUCKET_NAME")
-FILE_KEY = Variable.get("FILE_KEY")
-ARTIFACT_ROOT = Variable.get("ARTIFACT_ROOT")
+def _iter_files(root, dir_filter=None):
+    """Recursively yield DirEntry objects for every file under root.
 
+    os.scandir returns entries whose stat() results are served from the
+    directory read itself, so callers filtering on mtime avoid the extra
+    stat() syscall per file that os.walk + os.path.getmtime costs.
+    ``dir_filter``, if given, is called with each directory name and lets
+    the caller prune whole subtrees without descending into them.
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if dir_filter is None or dir_filter(entry.name):
+                    yield from _iter_files(entry.path, dir_filter)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def _get_config():
+    """Fetch the whole pipeline config in one metadata DB round-trip.
+
+    All per-key Variables (JENKINS_URL, AMI_ID, ...) live in a single JSON
+    Variable named ``fd_config``, so a task needing several settings issues
+    one SELECT instead of one per key.
+    """
+    return Variable.get("fd_config", deserialize_json=True)
+
+
+def _get_aws_credentials():
+    """Read the Airflow AWS connection (at task runtime, not parse time)."""
+    aws_conn = BaseHook.get_connection('aws_default')
+    region_name = aws_conn.extra_dejson.get('region_name', 'eu-west-3')  # Default to 'eu-west-3'
+    return aws_conn.login, aws_conn.password, region_name
 
-if not all([JENKINS_URL, JENKINS_USER, JENKINS_TOKEN]):
-    raise ValueError("Missing one or more Jenkins configuration environment variables")
 
 # DAG Configuration
 DAG_ID = 'fd_jenkins_ec2_training_dag'
@@ -68,50 +83,26 @@ with DAG(
     tags=['jenkins', 'ec2', 'ml-training'],
 ) as dag:
 
-    # Step 1: Poll Jenkins Job Status
-    @task
-    def poll_jenkins_job():
-        """Poll Jenkins for the job status and check for successful build."""
-        import requests
-        import time
-
-        # Step 1: Get the latest build number from the job API
-        job_url = f"{JENKINS_URL}/job/{JENKINS_JOB_NAME}/api/json"
-        response = requests.get(job_url, auth=(JENKINS_USER, JENKINS_TOKEN))
-        if response.status_code != 200:
-            raise Exception(f"Failed to query Jenkins API: {response.status_code}")
-
-        job_info = response.json()
-        latest_build_number = job_info['lastBuild']['number']
-
-        # Step 2: Poll the latest build's status
-        build_url = f"{JENKINS_URL}/job/{JENKINS_JOB_NAME}/{latest_build_number}/api/json"
-        
-        while True:
-            response = requests.get(build_url, auth=(JENKINS_USER, JENKINS_TOKEN))
-            if response.status_code == 200:
-                build_info = response.json()
-                if not build_info['building']:  # Build is finished
-                    if build_info['result'] == 'SUCCESS':
-                        print("Jenkins build successful!")
-                        return True
-                    else:
-                        raise Exception("Jenkins build failed!")
-            else:
-                raise Exception(f"Failed to query Jenkins API: {response.status_code}")
-            
-            time.sleep(30)  # Poll every 30 seconds
+    # Step 1: Poll Jenkins Job Status (deferrable: the poll loop runs on the
+    # triggerer, so no worker slot is held while the build is in progress)
+    jenkins_poll = JenkinsBuildSensor(
+        task_id="poll_jenkins_job",
+        poll_timeout=2 * 60 * 60,  # Give up after 2 hours of polling
+    )
 
     # Step 2: Create EC2 Instance Using EC2 Operator
     create_ec2_instance = EC2CreateInstanceOperator(
         task_id="create_ec2_instance",
-        image_id= AMI_ID,  
+        image_id="{{ var.json.fd_config.AMI_ID }}",  # Templated: resolved at run time, not parse time
         max_count=1,
         min_count=1,
         config={  # Dictionary for arbitrary parameters to the boto3 `run_instances` call
-            "InstanceType": INSTANCE_TYPE,
-            "KeyName": KEY_PAIR_NAME,  
-            "SecurityGroupIds": [SECURITY_GROUP_ID],  
+            "InstanceType": "{{ var.json.fd_config.INSTANCE_TYPE }}",
+            "KeyName": "{{ var.json.fd_config.KEY_PAIR_NAME }}",
+            "SecurityGroupIds": ["{{ var.json.fd_config.SECURITY_GROUP_ID }}"],
+            # Instance profile grants the training box S3/MLflow access, so
+            # no static AWS keys need to travel over SSH
+            "IamInstanceProfile": {"Name": "{{ var.json.fd_config.IAM_INSTANCE_PROFILE }}"},
             "TagSpecifications": [
                 {
                     'ResourceType': 'instance',
@@ -119,73 +110,42 @@ with DAG(
                 }
             ]
         },
-        wait_for_completion=True,  # Wait for the instance to be running before proceeding
+        wait_for_completion=False,  # The deferrable sensor below does the waiting
     )
 
-    # Step 3: Use EC2 Sensor to Check if Instance is Running
-    @task
-    def check_ec2_status(instance_id):
-        """Check if the EC2 instance has passed both status checks (2/2 checks passed)."""
-        
-        ec2_client = boto3.client(
-            'ec2', 
-            aws_access_key_id=aws_access_key_id,
-            aws_secret_access_key=aws_secret_access_key,
-            region_name=region_name
-        )  
-        passed_checks = False
-        
-        while not passed_checks:
-            # Get the instance status
-            response = ec2_client.describe_instance_status(InstanceIds=instance_id)
-
-            # Check if there is any status information returned
-            if response['InstanceStatuses']:
-                instance_status = response['InstanceStatuses'][0]
-
-                system_status = instance_status['SystemStatus']['Status']
-                instance_status_check = instance_status['InstanceStatus']['Status']
-                
-                # Log the current status
-                print(f"System Status: {system_status}, Instance Status: {instance_status_check}")
-                
-                # Check if both status checks are passed
-                if system_status == 'ok' and instance_status_check == 'ok':
-                    print(f"Instance {instance_id} has passed 2/2 status checks.")
-                    passed_checks = True
-                else:
-                    print(f"Waiting for instance {instance_id} to pass 2/2 status checks...")
-            else:
-                print(f"No status available for instance {instance_id} yet. Waiting...")
-
-            # Wait before polling again
-            time.sleep(15)
-
-        return True
+    # Step 3: Wait for the instance to be running, deferrably. This is the
+    # single wait in the pipeline: creation no longer blocks a worker slot,
+    # and the public-IP task below reads instance state without re-waiting
+    wait_for_ec2_running = EC2InstanceStateSensor(
+        task_id="wait_for_ec2_running",
+        instance_id="{{ task_instance.xcom_pull(task_ids='create_ec2_instance', key='return_value')[0] }}",
+        target_state="running",
+        deferrable=True,
+    )
 
     # Step 4: Define Run Training as an @task to Get EC2 Public IP
     @task
     def get_ec2_public_ip(instance_id):
         """Retrieve the EC2 instance public IP for SSH."""
-    
 
-        # Initialize the EC2 resource using boto3 with credentials from Airflow connection
-        ec2 = boto3.resource(
+        aws_access_key_id, aws_secret_access_key, region_name = _get_aws_credentials()
+
+        # Initialize the EC2 client using boto3 with credentials from the
+        # Airflow connection (the client skips the resource layer's extra
+        # object construction)
+        ec2_client = boto3.client(
             'ec2',
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key,
             region_name=region_name
         )
 
-        # Access EC2 instance by ID
-        instance = ec2.Instance(instance_id[0])
-
-        # Wait for the instance to be running
-        instance.wait_until_running()
-        instance.reload()
+        # One describe_instances call: the upstream sensor already waited
+        # for the running state
+        response = ec2_client.describe_instances(InstanceIds=[instance_id[0]])
 
         # Get the instance's public IP
-        public_ip = instance.public_ip_address
+        public_ip = response['Reservations'][0]['Instances'][0]['PublicIpAddress']
         print(f"Public IP of EC2 Instance: {public_ip}")
 
         # Return the public IP for the SSH task
@@ -197,46 +157,64 @@ with DAG(
     def run_training_via_paramiko(public_ip):
         """Use Paramiko to SSH into the EC2 instance and run ML training."""
 
-        print("PUBLIC IP:",public_ip)
-        # Initialize SSH client
-        ssh_client = paramiko.SSHClient()
-        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # Automatically add unknown hosts
+        # Retrieve env variables for MLFlow to run (one fd_config fetch)
+        cfg = _get_config()
+        KEY_PATH = cfg.get("KEY_PATH")  # Path to your private key inside the container
+        MLFLOW_TRACKING_URI = cfg.get("MLFLOW_TRACKING_URI")
+        MLFLOW_EXPERIMENT_ID = cfg.get("MLFLOW_EXPERIMENT_ID")
+        BUCKET_NAME = cfg.get("BUCKET_NAME")
+        FILE_KEY = cfg.get("FILE_KEY")
+        ARTIFACT_ROOT = cfg.get("ARTIFACT_ROOT")
 
-        # Load private key
-        private_key = paramiko.RSAKey.from_private_key_file(KEY_PATH)
+        print("PUBLIC IP:",public_ip)
 
         try:
-            # Establish an SSH connection
-            ssh_client.connect(hostname=public_ip, username='ubuntu', pkey=private_key)
-
-            # Export environment variables 
-            command = f"""
-            export MLFLOW_TRACKING_URI={MLFLOW_TRACKING_URI}
-            export MLFLOW_EXPERIMENT_ID={MLFLOW_EXPERIMENT_ID}
-            export AWS_ACCESS_KEY_ID={AWS_ACCESS_KEY_ID}
-            export AWS_SECRET_ACCESS_KEY={AWS_SECRET_ACCESS_KEY}
-            export ARTIFACT_ROOT={ARTIFACT_ROOT}
-            export BUCKET_NAME={BUCKET_NAME}
-            export FILE_KEY={FILE_KEY}
-            export PATH=$PATH:/home/ubuntu/.local/bin
-            mlflow run https://github.com/VeeraK81/pipeline-workflow --build-image    
-            """
-            
+            # Get a pooled SSH connection (reused if one is already open to
+            # this host, so follow-up commands skip the handshake)
+            ssh_client = ssh_pool.get(public_ip, 'ubuntu', KEY_PATH)
+
+            # Export environment variables
+            # AWS credentials come from the instance profile on the EC2, so
+            # only the MLflow settings need to be passed along. They travel
+            # as SSH2 env requests (environment=) rather than a heredoc of
+            # export lines, so nothing is tokenized by the remote shell or
+            # visible in its history; requires AcceptEnv for these names in
+            # the instance's sshd_config
+            env = {
+                "MLFLOW_TRACKING_URI": MLFLOW_TRACKING_URI,
+                "MLFLOW_EXPERIMENT_ID": MLFLOW_EXPERIMENT_ID,
+                "ARTIFACT_ROOT": ARTIFACT_ROOT,
+                "BUCKET_NAME": BUCKET_NAME,
+                "FILE_KEY": FILE_KEY,
+            }
+            command = "PATH=$PATH:/home/ubuntu/.local/bin mlflow run https://github.com/VeeraK81/pipeline-workflow --build-image"
+
             # Run your training command via SSH
-            stdin, stdout, stderr = ssh_client.exec_command(command)
-            
-            # Print the output for debugging
-            for line in stdout:
-                print(line.strip())
-            for line in stderr:
-                print(line.strip())
+            stdin, stdout, stderr = ssh_client.exec_command(command, environment=env)
+
+            # Stream stdout/stderr as they arrive via non-blocking channel
+            # reads: the old blocking iterators drained stdout before stderr
+            # (a task printing to stderr first looked hung) and buffered
+            # whole streams in memory
+            channel = stdout.channel
+            while True:
+                while channel.recv_ready():
+                    print(channel.recv(32768).decode('utf-8', errors='replace'), end='')
+                while channel.recv_stderr_ready():
+                    print(channel.recv_stderr(32768).decode('utf-8', errors='replace'), end='')
+                if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                time.sleep(0.1)
+
+            exit_status = channel.recv_exit_status()
+            if exit_status != 0:
+                raise Exception(f"Training command exited with status {exit_status}")
 
         except Exception as e:
             print(f"Error occurred during SSH: {str(e)}")
+            # Drop the pooled connection: it may be the thing that broke
+            ssh_pool.close(public_ip, 'ubuntu')
             raise
-        finally:
-            # Close the SSH connection
-            ssh_client.close()
 
 
     # Step 6: Terminate EC2 Instance
@@ -254,7 +232,7 @@ with DAG(
     def write_logs_s3():
         # S3 Configuration
         s3_hook = S3Hook(aws_conn_id="aws_default")
-        S3_BUCKET_NAME = BUCKET_NAME
+        S3_BUCKET_NAME = _get_config().get("BUCKET_NAME")
         S3_KEY_PREFIX = "logs/airflow_fraud_detection_logs"
 
         # Base log folder from Airflow configuration
@@ -265,68 +243,133 @@ with DAG(
 
         # Current timestamp for unique file naming
         timestamp = datetime.utcnow().strftime('%Y-%m-%d_%H-%M-%S')
-        consolidated_log_file = f"airflow_fd_logs_{timestamp}.txt"
-
-        try:
-            # Use StringIO for in-memory log consolidation (avoid writing to disk)
-            log_content = StringIO()
-            logging.info(f"Collecting today's logs from {base_log_folder}...")
-
-            # Walk through the base log folder and filter today's logs based on file modification date
-            for root, dirs, files in os.walk(base_log_folder):
-                for file in files:
-                    log_path = os.path.join(root, file)
-
-                    # Check if the log file was modified today
-                    try:
-                        file_modified_time = datetime.utcfromtimestamp(os.path.getmtime(log_path)).date()
-                        if file_modified_time == today:
-                            log_content.write(f"--- Log file: {log_path} ---\n")
-                            with open(log_path, 'r') as f:
-                                log_content.write(f.read())
-                                log_content.write("\n\n")
-                    except Exception as e:
-                        logging.warning(f"Could not read or process log file {log_path}: {str(e)}")
-
-            # If there are logs collected for today
-            if log_content.tell() > 0:
-                # Reset the StringIO object to the beginning before reading
-                log_content.seek(0)
-
-                # Convert the StringIO content to bytes
-                log_bytes = log_content.getvalue().encode('utf-8')
-
-                # Wrap the bytes in a BytesIO object to make it file-like
-                log_file_obj = BytesIO(log_bytes)
-
-                # Upload the consolidated log content to S3 directly
-                s3_key = f"{S3_KEY_PREFIX}/{consolidated_log_file}"
-                logging.info(f"Uploading consolidated log file to S3: {S3_BUCKET_NAME}/{s3_key}")
-                s3_hook.load_file_obj(
-                    file_obj=log_file_obj,
-                    key=s3_key,
-                    bucket_name=S3_BUCKET_NAME,
-                    replace=True
+        consolidated_log_file = f"airflow_fd_logs_{timestamp}.txt.gz"
+        s3_key = f"{S3_KEY_PREFIX}/{consolidated_log_file}"
+
+        # Multipart part size: S3 requires >= 5MB per part (except the last)
+        PART_SIZE = 8 * 1024 * 1024
+
+        logging.info(f"Collecting today's logs from {base_log_folder}...")
+
+        # Airflow run directories embed the logical date in their name
+        # (e.g. run_id=scheduled__2025-08-31T...), so subtrees for other
+        # days can be pruned without ever reading them. The logical date of
+        # a scheduled run is the previous interval - for this nightly DAG
+        # the run executing today sits in a directory naming yesterday - so
+        # both dates are kept and the mtime check below does the final
+        # filtering; anything that does not look like a run directory is
+        # always descended into
+        keep_prefixes = (today.isoformat(), (today - timedelta(days=1)).isoformat())
+
+        def _keep_dir(name):
+            looks_like_run_dir = name.startswith('run_id=') or '__' in name
+            return not looks_like_run_dir or any(prefix in name for prefix in keep_prefixes)
+
+        # Scan the base log folder and collect today's logs based on file
+        # modification date (scandir serves stat() from the directory read,
+        # halving the syscalls of the old os.walk + getmtime pass, and the
+        # dir filter skips old run subtrees entirely)
+        log_paths = []
+        for entry in _iter_files(base_log_folder, dir_filter=_keep_dir):
+            try:
+                if datetime.utcfromtimestamp(entry.stat().st_mtime).date() == today:
+                    log_paths.append(entry.path)
+            except OSError as e:
+                logging.warning(f"Could not stat log file {entry.path}: {str(e)}")
+
+        if not log_paths:
+            logging.info("No logs found for today.")
+            return
+
+        # Stream the consolidated logs to S3 as a gzipped multipart upload:
+        # each file is read in chunks straight off disk, compressed on the
+        # fly (task logs are redundant text and shrink ~10-20x), and shipped
+        # as soon as a part fills, so peak memory stays ~PART_SIZE no matter
+        # how large the day's logs are (the old StringIO+BytesIO approach
+        # held everything in RAM twice, uncompressed)
+        s3_client = s3_hook.get_conn()
+        logging.info(f"Uploading consolidated log file to S3: {S3_BUCKET_NAME}/{s3_key}")
+        upload = s3_client.create_multipart_upload(
+            Bucket=S3_BUCKET_NAME, Key=s3_key,
+            ContentType='text/plain', ContentEncoding='gzip',
+        )
+        upload_id = upload['UploadId']
+        parts = []
+        buffer = bytearray()
+
+        # File-like sink so GzipFile streams compressed bytes into the
+        # multipart buffer without materializing the whole blob
+        class _BufferSink:
+            def write(self, data):
+                buffer.extend(data)
+                return len(data)
+
+        gz = gzip.GzipFile(fileobj=_BufferSink(), mode='wb', compresslevel=6)
+
+        def _flush_parts(final=False):
+            while len(buffer) >= PART_SIZE or (final and buffer):
+                chunk = bytes(buffer[:PART_SIZE])
+                del buffer[:PART_SIZE]
+                part_number = len(parts) + 1
+                response = s3_client.upload_part(
+                    Bucket=S3_BUCKET_NAME, Key=s3_key, UploadId=upload_id,
+                    PartNumber=part_number, Body=chunk,
                 )
+                parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
 
-                logging.info("Today's logs uploaded to S3.")
-            else:
-                logging.info("No logs found for today.")
+        def _read_file(path):
+            # Binary mode: bytes go to gzip as-is, no decode/encode copy
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except Exception as e:
+                logging.warning(f"Could not read or process log file {path}: {str(e)}")
+                return None
+
+        MAX_WORKERS = 16
+
+        try:
+            # Read files concurrently (I/O-bound, so threads overlap the
+            # disk waits) while pool.map keeps results in path order, and
+            # compress/ship them as they come back. Paths are fed to the
+            # pool one batch of MAX_WORKERS at a time: an unbatched map
+            # submits every read up front, and with the serial gzip+upload
+            # consumer draining slower than the readers produce, completed
+            # results would pile up to the full day's logs in memory
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+                for start in range(0, len(log_paths), MAX_WORKERS):
+                    batch = log_paths[start:start + MAX_WORKERS]
+                    for log_path, data in zip(batch, pool.map(_read_file, batch)):
+                        if data is None:
+                            continue
+                        gz.write(f"--- Log file: {log_path} ---\n".encode('utf-8'))
+                        gz.write(data)
+                        gz.write(b"\n\n")
+                        _flush_parts()
+
+            gz.close()  # Flush the trailing gzip block into the buffer
+            _flush_parts(final=True)
+            s3_client.complete_multipart_upload(
+                Bucket=S3_BUCKET_NAME, Key=s3_key, UploadId=upload_id,
+                MultipartUpload={'Parts': parts},
+            )
+            logging.info("Today's logs uploaded to S3.")
 
         except Exception as e:
+            s3_client.abort_multipart_upload(
+                Bucket=S3_BUCKET_NAME, Key=s3_key, UploadId=upload_id
+            )
             logging.error(f"Error during log collection or S3 upload: {str(e)}")
             raise
 
     
 
 #     # Task Chaining (DAG Workflow)
-    jenkins_poll = poll_jenkins_job()
     ec2_public_ip = get_ec2_public_ip(create_ec2_instance.output)
-    check_ec2_instance=check_ec2_status(create_ec2_instance.output)
     ssh_training_task = run_training_via_paramiko(ec2_public_ip)
     # Task Chaining (DAG Workflow)
     write_logs_task = write_logs_s3()
-    
-    # Define the task flow sequence in the pipeline    
-    jenkins_poll >> create_ec2_instance >> check_ec2_instance >> ec2_public_ip >> ssh_training_task >> terminate_instance >> write_logs_task
+
+    # Define the task flow sequence in the pipeline
+    jenkins_poll >> create_ec2_instance >> wait_for_ec2_running >> ec2_public_ip >> ssh_training_task >> terminate_instance >> write_logs_task
 
@@ -248,15 +248,17 @@ with DAG(
         s3_hook = S3Hook(aws_conn_id="aws_default")
         
         try:
-            # Step 1: Check if the CSV file already exists in S3
-            csv_rows = []
+            # Step 1: Check if the CSV file already exists in S3. The
+            # existing content is kept as-is - parsing every row with
+            # csv.reader and re-serializing it just to add one line would
+            # cost two full passes over the file for nothing
+            existing_data = ""
             try:
                 if s3_hook.check_for_key(S3_KEY, bucket_name=S3_BUCKET_NAME):
                     # Read existing CSV data from S3
                     existing_data = s3_hook.read_key(S3_KEY, bucket_name=S3_BUCKET_NAME)
-                    existing_csv = StringIO(existing_data)
-                    reader = csv.reader(existing_csv)
-                    csv_rows = list(reader)
+                    if existing_data and not existing_data.endswith("\n"):
+                        existing_data += "\n"
                     logging.info("Appending data to existing CSV file in S3.")
                 else:
                     logging.info("Creating new CSV file in S3 with transaction data.")
@@ -264,17 +266,14 @@ with DAG(
                 logging.error(f"Error reading existing CSV from S3: {str(e)}")
                 raise
 
-            
-            # Append the transaction data as a new row
-            csv_rows.append(transaction_data)
-
-            # Step 3: Write the updated CSV data back to S3
+            # Step 2: Serialize only the new transaction row
             output = StringIO()
             writer = csv.writer(output)
-            writer.writerows(csv_rows)
-            
+            writer.writerow(transaction_data)
+
+            # Step 3: Write the updated CSV data back to S3
             s3_hook.load_string(
-                string_data=output.getvalue(),
+                string_data=existing_data + output.getvalue(),
                 key=S3_KEY,
                 bucket_name=S3_BUCKET_NAME,
                 replace=True  # Overwrite the existing file
@@ -3,83 +3,69 @@ from airflow.operators.python import PythonOperator
 from datetime import datetime
 import pandas as pd
 from evidently import ColumnMapping
-
 from evidently.ui.workspace.cloud import CloudWorkspace
 from evidently.report import Report
-from evidently.metrics import *
-from evidently.metric_preset import DataDriftPreset, TargetDriftPreset, RegressionPreset
-
-from evidently.ui.workspace.cloud import CloudWorkspace
-
-from evidently.report import Report
-
-from evidently import metrics
-from evidently.metric_preset import DataQualityPreset
 from evidently.metric_preset import DataDriftPreset
-
-from evidently.test_suite import TestSuite
-from evidently.tests import *
-from evidently.test_preset import DataDriftTestPreset
-from evidently.tests.base_test import TestResult, TestStatus
-from evidently.ui.dashboards import DashboardPanelPlot
-from evidently.ui.dashboards import DashboardPanelTestSuite
-from evidently.ui.dashboards import PanelValue
-from evidently.ui.dashboards import PlotType
-from evidently.ui.dashboards import ReportFilter
-from evidently.ui.dashboards import TestFilter
-from evidently.ui.dashboards import TestSuitePanelType
-from evidently.renderers.html_widgets import WidgetSize
-import json
 import mlflow
 from airflow.models import Variable
 
-# Evidently Cloud API
-EVIDENTLY_BASE_URL = Variable.get("EVIDENTLY_BASE_URL")
-EVIDENTLY_PROJECT_ID = Variable.get("EVIDENTLY_PROJECT_ID")
-EVIDENTLY_API_TOKEN = Variable.get("EVIDENTLY_API_TOKEN")
-MLFLOW_TRACKING_URI=Variable.get("MLFLOW_TRACKING_URI")
-MLFLOW_EXPERIMENT_ID=Variable.get("MLFLOW_EXPERIMENT_ID")
+# NOTE: Variables are looked up inside the task callables rather than at
+# module scope: each top-level Variable.get is a metadata DB query paid on
+# every scheduler parse of this file.
 
 # Calculate metrics using Evidently
 def calculate_metrics(**kwargs):
+    # MLflow configuration: Load from Airflow Variables at task runtime
+    MLFLOW_TRACKING_URI = Variable.get("MLFLOW_TRACKING_URI")
+    MLFLOW_EXPERIMENT_ID = Variable.get("MLFLOW_EXPERIMENT_ID")
+
     # Set MLflow tracking URI
     mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
 
-    # Retrieve the runs from a specific experiment
-    runs = mlflow.search_runs(experiment_ids=MLFLOW_EXPERIMENT_ID)
+    # Retrieve only the two most recent GridSearchCV runs: filtering
+    # server-side instead of loading the whole experiment into a DataFrame
+    # keeps the result at two rows no matter how much run history accrues
+    runs = mlflow.search_runs(
+        experiment_ids=MLFLOW_EXPERIMENT_ID,
+        filter_string="tags.estimator_name = 'GridSearchCV'",
+        order_by=["attributes.start_time DESC"],
+        max_results=2,
+    )
 
-    # Filter out the GridSearchCV runs and get the latest and reference run IDs
-    gs_run_id = runs[runs['tags.estimator_name'] == "GridSearchCV"]
-    latest_run_id = gs_run_id.iloc[0]['run_id']
-    reference_run_id = gs_run_id.iloc[1]['run_id']
+    # Get the latest and reference run IDs
+    latest_run_id = runs.iloc[0]['run_id']
+    reference_run_id = runs.iloc[1]['run_id']
 
     # Retrieve metrics from MLflow for the current and reference runs
     reference_data = mlflow.get_run(reference_run_id).data.metrics
     current_data = mlflow.get_run(latest_run_id).data.metrics
-    
 
-    # Convert the metrics into a DataFrame for Evidently
-    reference_df = pd.DataFrame([reference_data])
-    current_df = pd.DataFrame([current_data])
-    
     print("latest_run_id", latest_run_id)
     print("reference_run_id", reference_run_id)
-    print("reference_df", reference_df)
+    print("reference_data", reference_data)
 
-    # Create a column mapping for Evidently (adjust according to your data)
-    data = [reference_df, current_df]
-
-    # Push the metrics to Evidently using Airflow XCom
+    # Push the plain metric dicts through XCom rather than DataFrames:
+    # XCom serializes its payload into the metadata DB, and shipping two
+    # DataFrames costs several redundant copies of the same numbers. The
+    # consumer rebuilds the one-row frames locally.
+    data = [reference_data, current_data]
     kwargs['ti'].xcom_push(key='evidently_metrics', value=data)
     
     
 
 # Send metrics to Evidently Cloud
 def send_to_evidently(**kwargs):
+    # Evidently Cloud API: Load from Airflow Variables at task runtime
+    EVIDENTLY_BASE_URL = Variable.get("EVIDENTLY_BASE_URL")
+    EVIDENTLY_PROJECT_ID = Variable.get("EVIDENTLY_PROJECT_ID")
+    EVIDENTLY_API_TOKEN = Variable.get("EVIDENTLY_API_TOKEN")
+
     data = kwargs['ti'].xcom_pull(key='evidently_metrics', task_ids='calculate_metrics')
-    reference_df = data[0]
-    current_df = data[1]
-    
+
+    # Convert the metrics into a DataFrame for Evidently
+    reference_df = pd.DataFrame([data[0]])
+    current_df = pd.DataFrame([data[1]])
+
     print("reference_df", reference_df)
     print("current_df", current_df)
     # If you have specific target or prediction columns, you can define them here
@@ -0,0 +1,175 @@
+"""Deferrable Jenkins build sensor for the fraud detection training DAG.
+
+The old poll_jenkins_job @task held an Airflow worker slot for the whole
+build, sleeping between HTTP polls. The sensor below defers to the triggerer
+instead: the worker slot is released as soon as the build number is known,
+and one triggerer process multiplexes any number of pending polls over
+asyncio. This lives in its own module (not the DAG file) because the
+triggerer re-imports triggers by dotted class path and the DAG file name
+`fd-pipeline-ml-training.py` is not a valid Python module name.
+"""
+import asyncio
+import random
+import time
+
+import aiohttp
+from airflow.exceptions import AirflowException
+from airflow.models import Variable
+from airflow.sensors.base import BaseSensorOperator
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+
+
+class JenkinsBuildTrigger(BaseTrigger):
+    """Async trigger that polls a Jenkins build until it finishes.
+
+    Polling uses exponential backoff + jitter (start ~2s, cap 60s) and
+    honours Retry-After on 429/503, mirroring the previous worker-side loop.
+    """
+
+    def __init__(self, build_url, jenkins_user, jenkins_token, poll_timeout=7200, build_number=None):
+        super().__init__()
+        self.build_url = build_url
+        self.jenkins_user = jenkins_user
+        self.jenkins_token = jenkins_token
+        self.poll_timeout = poll_timeout
+        self.build_number = build_number
+
+    def serialize(self):
+        return (
+            "fd_jenkins_sensor.JenkinsBuildTrigger",
+            {
+                "build_url": self.build_url,
+                "jenkins_user": self.jenkins_user,
+                "jenkins_token": self.jenkins_token,
+                "poll_timeout": self.poll_timeout,
+                "build_number": self.build_number,
+            },
+        )
+
+    async def run(self):
+        deadline = time.monotonic() + self.poll_timeout
+        # Separate counters: `attempt` paces the normal build polling,
+        # `error_attempt` paces 429/503 retries and resets on the next 200,
+        # so a transient throttle doesn't permanently accelerate the poll
+        # backoff toward its cap
+        attempt = 0
+        error_attempt = 0
+        auth = aiohttp.BasicAuth(self.jenkins_user, self.jenkins_token)
+
+        async with aiohttp.ClientSession(auth=auth) as session:
+            while True:
+                async with session.get(self.build_url) as response:
+                    if response.status == 200:
+                        build_info = await response.json()
+                        if not build_info['building']:  # Build is finished
+                            yield TriggerEvent({
+                                "status": build_info['result'],
+                                "build_number": self.build_number,
+                            })
+                            return
+                        delay = min(60, 2 * (2 ** attempt)) + random.uniform(0, 1)
+                        attempt += 1
+                        error_attempt = 0
+                    elif response.status in (429, 503):
+                        # Retry-After may be delta-seconds or an HTTP-date;
+                        # fall back to backoff when it isn't a plain number
+                        try:
+                            delay = float(response.headers.get('Retry-After'))
+                        except (TypeError, ValueError):
+                            delay = min(60, 2 * (2 ** error_attempt)) + random.uniform(0, 1)
+                        error_attempt += 1
+                    else:
+                        yield TriggerEvent({
+                            "status": "ERROR",
+                            "message": f"Failed to query Jenkins API: {response.status}",
+                        })
+                        return
+
+                if time.monotonic() + delay > deadline:
+                    yield TriggerEvent({
+                        "status": "ERROR",
+                        "message": f"Timed out after {self.poll_timeout}s waiting for Jenkins build",
+                    })
+                    return
+                await asyncio.sleep(delay)
+
+
+class JenkinsBuildSensor(BaseSensorOperator):
+    """Wait for the latest Jenkins build of a job to succeed, deferrably.
+
+    `execute` makes one synchronous call to resolve the latest build number,
+    then defers to :class:`JenkinsBuildTrigger` so no worker slot is held
+    while the build runs.
+    """
+
+    def __init__(self, poll_timeout=7200, **kwargs):
+        super().__init__(**kwargs)
+        self.poll_timeout = poll_timeout
+
+    def execute(self, context):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # Jenkins Configuration: Load from the shared fd_config Variable
+        cfg = Variable.get("fd_config", deserialize_json=True)
+        jenkins_url = cfg.get("JENKINS_URL")
+        jenkins_user = cfg.get("JENKINS_USER")
+        jenkins_token = cfg.get("JENKINS_TOKEN")
+        jenkins_job_name = cfg.get("JENKINS_JOB_NAME")
+
+        if not all([jenkins_url, jenkins_user, jenkins_token]):
+            raise ValueError("Missing one or more Jenkins configuration environment variables")
+
+        # Get the latest build number from the job API. A Session with a
+        # single pooled connection keeps any retried request on the same
+        # keep-alive socket instead of paying a TCP + TLS handshake each time
+        job_url = f"{jenkins_url}/job/{jenkins_job_name}/api/json"
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=1,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504]),
+        )
+        with requests.Session() as session:
+            session.auth = (jenkins_user, jenkins_token)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            response = session.get(job_url)
+        if response.status_code != 200:
+            raise AirflowException(f"Failed to query Jenkins API: {response.status_code}")
+
+        job_info = response.json()
+        latest_build_number = job_info['lastBuild']['number']
+
+        # Fail fast if no build has run since the last processed one: the
+        # nightly schedule would otherwise re-approve a stale success and
+        # pay for an EC2 training run with nothing new to train on
+        last_seen = int(Variable.get("fd_last_jenkins_build", default_var=0))
+        if latest_build_number <= last_seen:
+            raise AirflowException(
+                f"No new Jenkins build since build {last_seen}; nothing to train"
+            )
+
+        build_url = f"{jenkins_url}/job/{jenkins_job_name}/{latest_build_number}/api/json"
+
+        # Hand the poll loop off to the triggerer and free this worker slot
+        self.defer(
+            trigger=JenkinsBuildTrigger(
+                build_url=build_url,
+                jenkins_user=jenkins_user,
+                jenkins_token=jenkins_token,
+                poll_timeout=self.poll_timeout,
+                build_number=latest_build_number,
+            ),
+            method_name="execute_complete",
+        )
+
+    def execute_complete(self, context, event=None):
+        if event and event.get("status") == "SUCCESS":
+            # Record the processed build so the next run only proceeds on a
+            # newer one
+            if event.get("build_number") is not None:
+                Variable.set("fd_last_jenkins_build", event["build_number"])
+            self.log.info("Jenkins build successful!")
+            return True
+        raise AirflowException(event.get("message") or "Jenkins build failed!")
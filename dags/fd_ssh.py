@@ -0,0 +1,49 @@
+"""Shared paramiko SSH connection pool for the fraud detection DAGs.
+
+Every fresh SSH connection pays the full TCP + key-exchange handshake
+(~100ms-1s against EC2). The pool caches one connected paramiko.SSHClient
+per (host, user) for the lifetime of the worker process, so the training
+command and any follow-up commands (log tailing, cleanup) reuse the same
+established transport and multiplex channels over it instead of
+re-handshaking per call.
+"""
+import threading
+
+import paramiko
+
+
+class SSHClientPool:
+    """Cache of connected paramiko clients keyed by (host, user)."""
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, user, key_path):
+        """Return a connected client for (host, user), reusing a live one."""
+        with self._lock:
+            client = self._clients.get((host, user))
+            if client is not None:
+                transport = client.get_transport()
+                if transport is not None and transport.is_active():
+                    return client
+                # Stale connection: drop it and reconnect below
+                client.close()
+
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # Automatically add unknown hosts
+            private_key = paramiko.RSAKey.from_private_key_file(key_path)
+            client.connect(hostname=host, username=user, pkey=private_key)
+            self._clients[(host, user)] = client
+            return client
+
+    def close(self, host, user):
+        """Drop the cached client for (host, user), closing its transport."""
+        with self._lock:
+            client = self._clients.pop((host, user), None)
+        if client is not None:
+            client.close()
+
+
+# Module-level pool shared by every task in this worker process
+ssh_pool = SSHClientPool()